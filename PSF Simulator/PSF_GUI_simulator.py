@@ -206,6 +206,9 @@ class PSFGui(tk.Tk):
             f_tube=self.f_tube_mm*1e-3
         )
         
+        # Best-focus table over the depth slider range (uncorrected collar)
+        self.sim.focal_shift_table(5.0e-6)
+        
         # Update Info
         # Better: let sim calculate it.
         # Geometric formula: R = f_obj * NA
@@ -226,17 +229,14 @@ class PSFGui(tk.Tk):
             # GUI Defocus is now RELATIVE to the Best Focus at Depth
             gui_z_um = self.z_defocus_um.get()
             
-            # Get Depth and Indices for correction
+            # Get Depth and Collar for the focal shift
             depth_m = self.depth_um.get() * 1e-6
-            n1 = self.n_imm.get()
-            n2 = self.n_sample.get()
+            corr_val = self.correction_sa.get()
             
             # Focal Shift Correction
-            # Paraxial approx is (n1/n2).
-            # Empirical observation for High NA/Mismatch: The 'Best Focus' (peak intensity) 
-            # shifts more than paraxial. A factor of (n1/n2)^2 fits user data well.
-            # Depth 1um -> Shift ~1.3um. (1.518/1.33)^2 ~= 1.30.
-            shift_m = -depth_m * (n1 / n2)**2
+            # Best focus (peak on-axis intensity) at this depth and collar, from the
+            # simulator's cached focal-shift table (solved on pupil sums, no PSF scan)
+            shift_m = self.sim.focal_shift(depth_m, corr_val)
             
             # Total Z passed to simulation (Actual Defocus from Coverglass)
             total_z_m = (gui_z_um * 1e-6) + shift_m
@@ -258,9 +258,8 @@ class PSFGui(tk.Tk):
                  phase_current = self.sim.compute_cylindrical_phase(f_cyl_m)
             
             # Run Isotropic with Defocus and Phase Mask
-            # Now returns 6 values: img, bfp, ext_cam, ext_bfp, bfp_phase_vis, stats
-            corr_val = self.correction_sa.get()
-            img, bfp, ext_cam, ext_bfp, bfp_phase_vis, stats = self.sim.simulate_isotropic(z_defocus=total_z_m, phase_mask=phase_current, oversampling=overs, cam_pixel_um=pix_cam, depth=depth_m, correction_sa=corr_val)
+            # Returns 7 values: img, bfp, ext_cam, ext_bfp, bfp_phase_vis, saf_ratio, stats
+            img, bfp, ext_cam, ext_bfp, bfp_phase_vis, saf_ratio, stats = self.sim.simulate_isotropic(z_defocus=total_z_m, phase_mask=phase_current, oversampling=overs, cam_pixel_um=pix_cam, depth=depth_m, correction_sa=corr_val)
             
             # Store for interactivity
             self.current_img = img
@@ -282,8 +281,8 @@ class PSFGui(tk.Tk):
             # Overlay Info (Top-Right)
             info_str = f"Defocus: Rel={gui_z_um:.2f} um, Abs={(total_z_m*1e6):.2f} um\n"
             info_str += f"Depth: {depth_m*1e6:.2f} um\n"
-            info_str += f"NA: {self.na.get()}  n_imm: {n1}  Mag: {self.mag.get()}\n"
-            info_str += f"n_sample: {n2}\n"
+            info_str += f"NA: {self.na.get()}  n_imm: {self.n_imm.get()}  Mag: {self.mag.get()}\n"
+            info_str += f"n_sample: {self.n_sample.get()}\n"
             info_str += f"Pixel: {pix_cam} um"
             
             self.ax_img.text(0.95, 0.95, info_str, transform=self.ax_img.transAxes,
@@ -306,15 +305,16 @@ class PSFGui(tk.Tk):
                 # INSET BAR CHART for Aberrations
                 # [x, y, width, height] in normalized axes coords (Bottom Right)
                 ax_ins = self.ax_bfp.inset_axes([0.6, 0.02, 0.38, 0.3])
-                labels = list(stats.keys())
-                vals = list(stats.values())
+                # Per-term PV bars; overall RMS and on-axis Strehl in the title
+                labels = ['Depth', 'Defocus', 'Astig', 'Collar']
+                vals = [stats[k] for k in labels]
                 colors = ['cyan', 'lime', 'magenta', 'orange']
                 
                 # Use numeric positions to avoid Categorical Conversion Error
                 x_pos = np.arange(len(labels))
                 ax_ins.bar(x_pos, vals, color=colors, alpha=0.8)
                 
-                ax_ins.set_title("Phase PV (rad)", fontsize=7, color='white')
+                ax_ins.set_title(f"Phase PV (rad) | RMS {stats['RMS']:.2f}, Strehl {stats['Strehl']:.2f}", fontsize=7, color='white')
                 
                 # Set X-Ticks
                 ax_ins.set_xticks(x_pos)
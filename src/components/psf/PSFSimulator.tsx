@@ -642,9 +642,8 @@ export default function PSFSimulator() {
                         eff_n_sample += 0.001;
                     }
 
-                    const z_shift = -params.depth * Math.pow(params.n_imm / eff_n_sample, 2);
-                    const z_total = params.z_defocus + z_shift;
-                    const simArgs = { ...params, n_sample: eff_n_sample, z_defocus: z_total };
+                    // z_defocus is relative to the best focus at this depth (solved in Python, see focal_shift)
+                    const simArgs = { ...params, n_sample: eff_n_sample, focus: "best" };
                     const res = await runSimulation(simArgs, {});
                     setSimResult(res);
                 } catch (e: any) {
@@ -1231,6 +1230,11 @@ export default function PSFSimulator() {
                                             simResult?.stats && (
                                                 <div className="w-full h-full relative p-2">
                                                     <span className="text-[9px] font-mono text-gray-400 uppercase tracking-widest block absolute top-2 left-2">Aberration Power (PV) [rad]</span>
+                                                    {simResult.stats.RMS !== undefined && (
+                                                        <span className="text-[9px] font-mono text-gray-400 block absolute top-2 right-2">
+                                                            RMS {Number(simResult.stats.RMS).toFixed(2)} rad · Strehl {Number(simResult.stats.Strehl).toFixed(2)}
+                                                        </span>
+                                                    )}
                                                     <ResponsiveContainer width="100%" height="100%">
                                                         <BarChart data={[
                                                             { name: 'Depth', val: simResult.stats.Depth, fill: '#06b6d4' },
@@ -8,11 +8,48 @@ declare global {
 
 export type PyodideState = "LOADING" | "READY" | "ERROR";
 
+// Decode one array packed by SimulatorSession.run_compact into rows of floats
+function decodeArray(bytes: Uint8Array, meta: any): Float32Array[] {
+    const [h, w] = meta.shape;
+    const n = h * w;
+    const offset = bytes.byteOffset + meta.offset;
+    let values: Float32Array;
+
+    if (meta.encoding === "float32") {
+        values = new Float32Array(n);
+        values.set(new Float32Array(bytes.buffer, offset, n));
+    } else {
+        const q = meta.dtype === "uint8"
+            ? new Uint8Array(bytes.buffer, offset, n)
+            : new Uint16Array(bytes.buffer, offset, n);
+        const qmax = meta.dtype === "uint8" ? 255 : 65535;
+        values = new Float32Array(n);
+        for (let i = 0; i < n; i++) {
+            if (meta.encoding === "linear") {
+                values[i] = q[i] * meta.scale;
+            } else if (meta.encoding === "log") {
+                // q = 0 is zero intensity, 1..qmax spans [-decades, 0] decades below vmax
+                values[i] = q[i] === 0 ? 0 : meta.vmax * Math.pow(10, -meta.decades * (1 - (q[i] - 1) / (qmax - 1)));
+            } else {
+                values[i] = (q[i] / qmax) * 2 * Math.PI - Math.PI;
+            }
+        }
+    }
+
+    const rows: Float32Array[] = [];
+    for (let y = 0; y < h; y++) {
+        rows.push(values.subarray(y * w, (y + 1) * w));
+    }
+    return rows;
+}
+
 export function usePyodide() {
     const [state, setState] = useState<PyodideState>("LOADING");
     const [error, setError] = useState<string | null>(null);
     const pyodideRef = useRef<any>(null);
     const simulatorModuleRef = useRef<any>(null);
+    // Decoded arrays of the last result, reused when Python reports them unchanged
+    const lastArraysRef = useRef<Record<string, Float32Array[]>>({});
 
     useEffect(() => {
         let mounted = true;
@@ -46,8 +83,9 @@ export function usePyodide() {
                 });
 
                 // 3. Load Packages
+                // The simulator core only needs numpy (scipy is used if present, matplotlib not at all)
                 console.log("Loading packages...");
-                await pyodide.loadPackage(['numpy', 'scipy', 'matplotlib']);
+                await pyodide.loadPackage(['numpy']);
 
                 // 4. Load the Simulation Code
                 console.log("Fetching simulator code...");
@@ -105,121 +143,54 @@ export function usePyodide() {
             globals_dict: {
                 ...microscopeParams,
                 ...simParams
-            }
+            },
+            resend: Object.keys(lastArraysRef.current).length === 0
         });
 
-        // This script instantiates the microscope (if params changed/first run) and then runs simulation
-        // Note: For performance, we should ideally keep the microscope instance alive
-        // and only re-create if microscopeParams change.
-        // For now, to keep it simple and robust, we might re-instantiate or check.
-        // Let's implement a singleton pattern in the Python side or handle it here.
-
-        // We will maintain a global 'sim_instance' in the python namespace.
+        // The simulator session lives in the imported PSF_simulator module, so microscope
+        // instances and their caches persist across calls even though globals are fresh.
+        // Results come back as (JSON header, packed uint8 buffer); see SimulatorSession.run_compact.
         const script = `
-            import js
-            import numpy as np
-            from PSF_simulator import OpticalFourierMicroscope
-
-            # Access the passed parameters
-            params = dict(globals_dict)
-            
-            # Check if we need to (re)initialize the microscope
-            # We can store the last used config in a global variable
-            if 'current_microscope' not in locals() and 'current_microscope' not in globals():
-                current_microscope = None
-                last_conf = {}
-
-            # Determine if config changed (simplified check: just always init for now or check key vals)
-            # Re-initializing is not THAT expensive compared to the Green's tensor calc? 
-            # Actually Green's tensor usage IS the expensive part of the class?
-            # Looking at source: calculate_greens_tensor_bfp is called lazily or stored?
-            # sim.G_bfp is cached in 'simulate_isotropic' line 440.
-            # So we MUST persist the instance.
-
-            # Simple comparison of crucial keys
-            re_init = False
-            if current_microscope is None:
-                re_init = True
-            elif (last_conf.get('NA') != params.get('NA') or 
-                  last_conf.get('lambda_vac') != params.get('lambda_vac') or
-                  last_conf.get('n_imm') != params.get('n_imm') or
-                  last_conf.get('n_sample') != params.get('n_sample') or
-                  last_conf.get('M_obj') != params.get('M_obj')):
-                  re_init = True
-
-            if re_init:
-                current_microscope = OpticalFourierMicroscope(
-                    NA=float(params.get('NA', 1.49)),
-                    lambda_vac=float(params.get('lambda_vac', 600e-9)),
-                    n_imm=float(params.get('n_imm', 1.518)),
-                    n_sample=float(params.get('n_sample', 1.33)),
-                    M_obj=float(params.get('M_obj', 100)),
-                    f_tube=float(params.get('f_tube', 0.180))
-                )
-                last_conf = params.copy()
-            
-            # Astigmatism Phase Mask Calculation
-            astig_val = params.get('astigmatism', 'None')
-            phase_mask = None
-            f_cyl = 0
-            
-            if astig_val == "Weak":
-                f_cyl = -25.0 # meters? No guide said -25000/1000 = -25? Wait.
-                # Guide: f_cyl_m = -25000 / 1000.0  => -25 meters.
-                # "None", "Weak", "Strong" 
-                phase_mask = current_microscope.compute_cylindrical_phase(-25.0)
-            elif astig_val == "Strong":
-                phase_mask = current_microscope.compute_cylindrical_phase(-16.0)
-
-            # Run Simulation
-            # Handle backward compatibility if the class in memory is old (returns 5 values)
-            ret_val = current_microscope.simulate_isotropic(
-                z_defocus=float(params.get('z_defocus', 0.0)),
-                astigmatism=float(0.0), # Helper logic handles this via phase_mask, but we can pass 0 here or update signature
-                phase_mask=phase_mask,
-                oversampling=int(params.get('oversampling', 3)),
-                cam_pixel_um=float(params.get('cam_pixel_um', 6.5)),
-                depth=float(params.get('depth', 0.0)),
-                display_fov_um=float(params.get('display_fov_um', 300.0) or 300.0),
-                correction_sa=float(params.get('correction_sa', 0.0))
-            )
-            
-            saf_ratio = 0.0
-            stats = {}
-            
-            # Unpack based on length (Robustness)
-            if len(ret_val) == 7:
-                 img, bfp, ext_cam, ext_bfp, bfp_phase, saf_ratio, stats = ret_val
-            elif len(ret_val) == 6:
-                img, bfp, ext_cam, ext_bfp, bfp_phase, saf_ratio = ret_val
-            else:
-                img, bfp, ext_cam, ext_bfp, bfp_phase = ret_val
-
-            # Prepare output as a dictionary
-            # Convert numpy arrays to lists or direct buffers? 
-            # to_js() on numpy array works well in recent Pyodide versions
-            result = {
-                "img": img,
-                "bfp": bfp,
-                "ext_cam": ext_cam,
-                "ext_bfp": ext_bfp,
-                "bfp_phase": bfp_phase,
-                "saf_ratio": saf_ratio,
-                "stats": stats
-            }
-            result
+            from PSF_simulator import session
+            session.run_compact(globals_dict, resend=resend)
         `;
 
         try {
             const result = await py.runPythonAsync(script, { globals: globals });
-            const jsResult = result.toJs({ dict_converter: Object.fromEntries, create_proxies: false });
+            const header = JSON.parse(result.get(0));
+            const bufferProxy = result.get(1);
+
+            // Zero-copy view on the NumPy buffer, decoded straight into row arrays
+            const pyBuffer = bufferProxy.getBuffer("u8");
+            const arrays: Record<string, Float32Array[]> = {};
+            try {
+                for (const [name, meta] of Object.entries<any>(header.arrays)) {
+                    arrays[name] = decodeArray(pyBuffer.data, meta);
+                }
+            } finally {
+                pyBuffer.release();
+                bufferProxy.destroy();
+            }
+            for (const name of header.unchanged) {
+                arrays[name] = lastArraysRef.current[name];
+            }
+            lastArraysRef.current = arrays;
 
             // Clean up
             globals.destroy();
             result.destroy();
 
-            return jsResult;
+            return {
+                img: arrays.img,
+                bfp: arrays.bfp,
+                bfp_phase: arrays.bfp_phase,
+                ext_cam: header.ext_cam,
+                ext_bfp: header.ext_bfp,
+                saf_ratio: header.saf_ratio,
+                stats: header.stats
+            };
         } catch (e) {
+            lastArraysRef.current = {};
             console.error("Simulation Error", e);
             throw e;
         }